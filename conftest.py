@@ -0,0 +1,12 @@
+import os
+
+# the tests are run in parallel with pytest-xdist, one process per core, so
+# keep the threaded math libraries used by numpy and galsim from each
+# spawning a thread per core as well.  This is loaded before the worker
+# processes are started, so they inherit these settings
+for _name in (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+):
+    os.environ.setdefault(_name, "1")
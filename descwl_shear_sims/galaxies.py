@@ -37,8 +37,9 @@ def make_galaxy_catalog(
     coadd_dim: int
         Dimensions of coadd
     buff: int, optional
-        Buffer around the edge where no objects are drawn.  Ignored for
-        layout 'grid'.  Default 0.
+        Buffer around the edge where no objects are drawn.  For layout
+        'grid' the grid is not changed, but objects falling in the buffer
+        are removed.  Default 0.
     layout: string, optional
         'grid' or 'random'.  Ignored for gal_type "wldeblend", otherwise
         required.
@@ -158,8 +159,9 @@ class FixedGalaxyCatalog(object):
     hlr: float
         Half light radius of all objects
     buff: int, optional
-        Buffer region with no objects, on all sides of image.  Ingored
-        for layout 'grid'.  Default 0.
+        Buffer region with no objects, on all sides of image.  For layout
+        'grid' the grid is not changed, but objects falling in the buffer
+        are removed.  Default 0.
     morph: str
         Galaxy morphology, 'exp', 'dev' or 'bd', 'bdk'.  Default 'exp'
     """
@@ -257,8 +259,9 @@ class GalaxyCatalog(FixedGalaxyCatalog):
     hlr: float
         Half light radius of all objects
     buff: int, optional
-        Buffer region with no objects, on all sides of image.  Ingored
-        for layout 'grid'.  Default 0.
+        Buffer region with no objects, on all sides of image.  For layout
+        'grid' the grid is not changed, but objects falling in the buffer
+        are removed.  Default 0.
     morph: str
         Galaxy morphology, 'exp', 'dev' or 'bd', 'bdk'.  Default 'exp'
     """
@@ -585,8 +588,9 @@ class WLDeblendGalaxyCatalog(object):
     coadd_dim: int
         Dimensions of the coadd
     buff: int, optional
-        Buffer region with no objects, on all sides of image.  Ingored
-        for layout 'grid'.  Default 0.
+        Buffer region with no objects, on all sides of image.  For layout
+        'grid' the grid is not changed, but objects falling in the buffer
+        are removed.  Default 0.
     layout: str, optional
 
     """
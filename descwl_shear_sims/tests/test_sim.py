@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 import pytest
 import numpy as np
 import lsst.afw.image as afw_image
@@ -8,9 +9,89 @@ from descwl_shear_sims.galaxies import make_galaxy_catalog, DEFAULT_FIXED_GAL_CO
 from descwl_shear_sims.stars import StarCatalog, make_star_catalog
 from descwl_shear_sims.psfs import make_fixed_psf, make_ps_psf
 
-from descwl_shear_sims.sim import make_sim, get_se_dim
+from descwl_shear_sims.sim import make_sim
+from descwl_shear_sims.sim import get_se_dim as _get_se_dim
 from descwl_shear_sims.constants import ZERO_POINT
 
+# the se dims are pure functions of the inputs, reuse them across tests
+get_se_dim = lru_cache(maxsize=None)(_get_se_dim)
+
+# for tests using the wldeblend galaxies or stars
+requires_catsim = pytest.mark.skipif(
+    "CATSIM_DIR" not in os.environ,
+    reason='simulation input data is not present',
+)
+
+
+@pytest.fixture
+def rng(request):
+    """
+    a new random state for each test, seeded with 7421 by default.  Send a
+    different seed with @pytest.mark.parametrize("rng", [seed], indirect=True)
+    """
+    seed = getattr(request, 'param', 7421)
+    return np.random.RandomState(seed)
+
+
+# the fixed galaxy catalogs and psfs are only read by make_sim, so they can be
+# built once per module and shared across the parametrized cases
+
+@pytest.fixture(scope="module")
+def fixed_gauss_psf():
+    return make_fixed_psf(psf_type="gauss")
+
+
+@pytest.fixture(scope="module")
+def fixed_grid_catalog_101():
+    rng = np.random.RandomState(431)
+    return make_galaxy_catalog(
+        rng=rng,
+        gal_type="fixed",
+        coadd_dim=101,
+        buff=5,
+        layout="grid",
+    )
+
+
+@pytest.fixture(scope="module")
+def fixed_grid_catalog_201():
+    rng = np.random.RandomState(7421)
+    return make_galaxy_catalog(
+        rng=rng,
+        gal_type="fixed",
+        coadd_dim=201,
+        buff=30,
+        layout="grid",
+    )
+
+
+@pytest.fixture(scope="module")
+def fixed_grid_catalog_351():
+    rng = np.random.RandomState(74321)
+    return make_galaxy_catalog(
+        rng=rng,
+        gal_type="fixed",
+        coadd_dim=351,
+        buff=30,
+        layout="grid",
+    )
+
+
+@pytest.fixture(scope="module")
+def wldeblend_catalog_201():
+    # the rng is only used while building the catalog, so it can be
+    # shared by tests that make their own rng for the sim.  Use a seed not
+    # used for the star catalogs, which are drawn the same way, so the
+    # stars do not land on the galaxy positions
+    rng = np.random.RandomState(9163)
+    return make_galaxy_catalog(
+        rng=rng,
+        gal_type="wldeblend",
+        coadd_dim=201,
+        buff=30,
+        layout="random",
+    )
+
 
 @pytest.mark.parametrize('dither,rotate', [
     (False, False),
@@ -18,34 +99,25 @@ from descwl_shear_sims.constants import ZERO_POINT
     (True, False),
     (True, True),
 ])
-def test_sim_smoke(dither, rotate):
+@pytest.mark.parametrize("rng", [74321], indirect=True)
+def test_sim_smoke(
+    dither, rotate, rng, fixed_grid_catalog_101, fixed_gauss_psf,
+):
     """
     test sim can run
     """
-    seed = 74321
-    rng = np.random.RandomState(seed)
-
-    coadd_dim = 351
-    psf_dim = 51
+    coadd_dim = 101
+    psf_dim = 25
     bands = ["i"]
-    galaxy_catalog = make_galaxy_catalog(
-        rng=rng,
-        gal_type="fixed",
-        coadd_dim=coadd_dim,
-        buff=30,
-        layout="grid",
-    )
-
-    psf = make_fixed_psf(psf_type="gauss")
     data = make_sim(
         rng=rng,
-        galaxy_catalog=galaxy_catalog,
+        galaxy_catalog=fixed_grid_catalog_101,
         coadd_dim=coadd_dim,
         psf_dim=psf_dim,
         bands=bands,
         g1=0.02,
         g2=0.00,
-        psf=psf,
+        psf=fixed_gauss_psf,
         dither=dither,
         rotate=rotate,
     )
@@ -67,36 +139,25 @@ def test_sim_smoke(dither, rotate):
         assert isinstance(bdata[0], afw_image.ExposureF)
 
 
-def test_sim_se_dim():
+@pytest.mark.parametrize("rng", [74321], indirect=True)
+def test_sim_se_dim(rng, fixed_grid_catalog_351, fixed_gauss_psf):
     """
     test sim can run
     """
-    seed = 74321
-    rng = np.random.RandomState(seed)
-
     coadd_dim = 351
     se_dim = 351
     psf_dim = 51
     bands = ["i"]
-    galaxy_catalog = make_galaxy_catalog(
-        rng=rng,
-        gal_type="fixed",
-        coadd_dim=coadd_dim,
-        buff=30,
-        layout="grid",
-    )
-
-    psf = make_fixed_psf(psf_type="gauss")
     data = make_sim(
         rng=rng,
-        galaxy_catalog=galaxy_catalog,
+        galaxy_catalog=fixed_grid_catalog_351,
         coadd_dim=coadd_dim,
         se_dim=se_dim,
         psf_dim=psf_dim,
         bands=bands,
         g1=0.02,
         g2=0.00,
-        psf=psf,
+        psf=fixed_gauss_psf,
     )
 
     dims = (se_dim, )*2
@@ -104,7 +165,8 @@ def test_sim_se_dim():
 
 
 @pytest.mark.parametrize("rotate", [False, True])
-def test_sim_exp_mag(rotate, show=False):
+@pytest.mark.parametrize("rng", [55], indirect=True)
+def test_sim_exp_mag(rotate, rng, show=False):
     """
     test we get the right mag.  Also test we get small flux when we rotate and
     there is nothing at the sub image location we choose
@@ -115,9 +177,7 @@ def test_sim_exp_mag(rotate, show=False):
     ntrial = 10
 
     bands = ["i"]
-    seed = 55
     coadd_dim = 301
-    rng = np.random.RandomState(seed)
 
     # use fixed single epoch dim so we can look in the same spot for the object
     se_dim = get_se_dim(coadd_dim=coadd_dim, dither=False, rotate=True)
@@ -174,31 +234,24 @@ def test_sim_exp_mag(rotate, show=False):
 
 
 @pytest.mark.parametrize("psf_type", ["gauss", "moffat", "ps"])
-def test_sim_psf_type(psf_type):
-
-    seed = 431
-    rng = np.random.RandomState(seed)
+@pytest.mark.parametrize("rng", [431], indirect=True)
+def test_sim_psf_type(psf_type, rng, fixed_grid_catalog_101, fixed_gauss_psf):
 
     dither = True
     rotate = True
     coadd_dim = 101
-    galaxy_catalog = make_galaxy_catalog(
-        rng=rng,
-        gal_type="fixed",
-        coadd_dim=coadd_dim,
-        buff=5,
-        layout="grid",
-    )
 
     if psf_type == "ps":
         se_dim = get_se_dim(coadd_dim=coadd_dim, dither=dither, rotate=rotate)
         psf = make_ps_psf(rng=rng, dim=se_dim)
+    elif psf_type == "gauss":
+        psf = fixed_gauss_psf
     else:
         psf = make_fixed_psf(psf_type=psf_type)
 
     _ = make_sim(
         rng=rng,
-        galaxy_catalog=galaxy_catalog,
+        galaxy_catalog=fixed_grid_catalog_101,
         coadd_dim=coadd_dim,
         g1=0.02,
         g2=0.00,
@@ -209,32 +262,22 @@ def test_sim_psf_type(psf_type):
 
 
 @pytest.mark.parametrize('epochs_per_band', [1, 2, 3])
-def test_sim_epochs(epochs_per_band):
+def test_sim_epochs(
+    epochs_per_band, rng, fixed_grid_catalog_101, fixed_gauss_psf,
+):
 
-    seed = 7421
     bands = ["r", "i", "z"]
-    coadd_dim = 301
-    psf_dim = 47
-
-    rng = np.random.RandomState(seed)
-
-    galaxy_catalog = make_galaxy_catalog(
-        rng=rng,
-        gal_type="fixed",
-        coadd_dim=coadd_dim,
-        buff=10,
-        layout="grid",
-    )
+    coadd_dim = 101
+    psf_dim = 25
 
-    psf = make_fixed_psf(psf_type="gauss")
     sim_data = make_sim(
         rng=rng,
-        galaxy_catalog=galaxy_catalog,
+        galaxy_catalog=fixed_grid_catalog_101,
         coadd_dim=coadd_dim,
         psf_dim=psf_dim,
         g1=0.02,
         g2=0.00,
-        psf=psf,
+        psf=fixed_gauss_psf,
         bands=bands,
         epochs_per_band=epochs_per_band,
     )
@@ -246,10 +289,8 @@ def test_sim_epochs(epochs_per_band):
 
 
 @pytest.mark.parametrize("layout", ("grid", "random", "random_disk", "hex"))
-def test_sim_layout(layout):
-    seed = 7421
+def test_sim_layout(layout, rng, fixed_gauss_psf):
     coadd_dim = 201
-    rng = np.random.RandomState(seed)
 
     galaxy_catalog = make_galaxy_catalog(
         rng=rng,
@@ -259,14 +300,13 @@ def test_sim_layout(layout):
         layout=layout,
     )
 
-    psf = make_fixed_psf(psf_type="gauss")
     _ = make_sim(
         rng=rng,
         galaxy_catalog=galaxy_catalog,
         coadd_dim=coadd_dim,
         g1=0.02,
         g2=0.00,
-        psf=psf,
+        psf=fixed_gauss_psf,
     )
 
 
@@ -277,31 +317,23 @@ def test_sim_layout(layout):
      (False, True),
      (True, True)],
 )
-def test_sim_defects(cosmic_rays, bad_columns):
+def test_sim_defects(
+    cosmic_rays, bad_columns, rng, fixed_grid_catalog_201, fixed_gauss_psf,
+):
     ntrial = 10
-    seed = 7421
-    rng = np.random.RandomState(seed)
 
     coadd_dim = 201
 
-    galaxy_catalog = make_galaxy_catalog(
-        rng=rng,
-        gal_type="fixed",
-        coadd_dim=coadd_dim,
-        layout="grid",
-        buff=30,
-    )
-
-    psf = make_fixed_psf(psf_type="gauss")
-
+    # stop once an exposure with masked defects has been checked
+    verified = False
     for itrial in range(ntrial):
         sim_data = make_sim(
             rng=rng,
-            galaxy_catalog=galaxy_catalog,
+            galaxy_catalog=fixed_grid_catalog_201,
             coadd_dim=coadd_dim,
             g1=0.02,
             g2=0.00,
-            psf=psf,
+            psf=fixed_gauss_psf,
             cosmic_rays=cosmic_rays,
             bad_columns=bad_columns,
         )
@@ -314,32 +346,28 @@ def test_sim_defects(cosmic_rays, bad_columns):
 
                 if bad_columns or cosmic_rays:
 
-                    wnan = np.where(np.isnan(image))
-                    wflagged = np.where((mask & flags) != 0)
-                    assert wnan[0].size == wflagged[0].size
+                    n_nan = np.count_nonzero(np.isnan(image))
+                    n_flagged = np.count_nonzero(mask & flags)
+                    assert n_nan == n_flagged
 
+                    if n_nan > 0:
+                        verified = True
 
-@pytest.mark.skipif(
-    "CATSIM_DIR" not in os.environ,
-    reason='simulation input data is not present',
-)
-def test_sim_wldeblend():
-    seed = 7421
+        if verified:
+            break
+
+
+@requires_catsim
+def test_sim_wldeblend(rng, wldeblend_catalog_201):
     coadd_dim = 201
-    rng = np.random.RandomState(seed)
 
-    galaxy_catalog = make_galaxy_catalog(
-        rng=rng,
-        gal_type="wldeblend",
-        coadd_dim=coadd_dim,
-        buff=30,
-        layout="random",
-    )
+    galaxy_catalog = wldeblend_catalog_201
+    assert len(galaxy_catalog) == galaxy_catalog.shifts_array.size
 
     psf = make_fixed_psf(psf_type="moffat")
     _ = make_sim(
         rng=rng,
-        galaxy_catalog=galaxy_catalog,
+        galaxy_catalog=wldeblend_catalog_201,
         coadd_dim=coadd_dim,
         g1=0.02,
         g2=0.00,
@@ -347,98 +375,115 @@ def test_sim_wldeblend():
     )
 
 
-@pytest.mark.skipif(
-    "CATSIM_DIR" not in os.environ,
-    reason='simulation input data is not present',
-)
-@pytest.mark.parametrize('density,min_density,max_density', [
-    (None, 40, 100),
-    (20, None, None),
-])
-def test_sim_stars(density, min_density, max_density):
+def _make_star_sim(*, galaxy_catalog, config, use_maker):
+    """
+    make a sim with wldeblend galaxies and stars, with the star catalog made
+    either via make_star_catalog or directly from StarCatalog.  The rng is
+    reset each time so both ways should give identical images
+
+    Returns
+    -------
+    star_catalog, sim_data
+    """
     seed = 7421
     coadd_dim = 201
     buff = 30
 
-    config = {
-        'density': density,
-        'min_density': min_density,
-        'max_density': max_density,
-    }
-    for use_maker in (False, True):
-        rng = np.random.RandomState(seed)
+    rng = np.random.RandomState(seed)
 
-        galaxy_catalog = make_galaxy_catalog(
+    if use_maker:
+        star_catalog = make_star_catalog(
             rng=rng,
-            gal_type="wldeblend",
             coadd_dim=coadd_dim,
             buff=buff,
-            layout="random",
+            star_config=config,
         )
-        assert len(galaxy_catalog) == galaxy_catalog.shifts_array.size
-
-        if use_maker:
-            star_catalog = make_star_catalog(
-                rng=rng,
-                coadd_dim=coadd_dim,
-                buff=buff,
-                star_config=config,
-            )
 
-        else:
-            star_catalog = StarCatalog(
-                rng=rng,
-                coadd_dim=coadd_dim,
-                buff=buff,
-                density=config['density'],
-                min_density=config['min_density'],
-                max_density=config['max_density'],
-            )
+    else:
+        star_catalog = StarCatalog(
+            rng=rng,
+            coadd_dim=coadd_dim,
+            buff=buff,
+            density=config['density'],
+            min_density=config['min_density'],
+            max_density=config['max_density'],
+        )
+
+    psf = make_fixed_psf(psf_type="moffat")
+
+    # tests that we actually get bright objects set are in
+    # test_star_masks_and_bleeds
+
+    sim_data = make_sim(
+        rng=rng,
+        galaxy_catalog=galaxy_catalog,
+        star_catalog=star_catalog,
+        coadd_dim=coadd_dim,
+        g1=0.02,
+        g2=0.00,
+        psf=psf,
+    )
+    return star_catalog, sim_data
 
-        assert len(star_catalog) == star_catalog.shifts_array.size
 
-        psf = make_fixed_psf(psf_type="moffat")
+STAR_CONFIGS = {
+    'sampled': {'density': None, 'min_density': 40, 'max_density': 100},
+    'fixed': {'density': 20, 'min_density': None, 'max_density': None},
+}
 
-        # tests that we actually get bright objects set are in
-        # test_star_masks_and_bleeds
 
-        data = make_sim(
-            rng=rng,
-            galaxy_catalog=galaxy_catalog,
-            star_catalog=star_catalog,
-            coadd_dim=coadd_dim,
-            g1=0.02,
-            g2=0.00,
-            psf=psf,
-        )
+@pytest.fixture(scope="module", params=list(STAR_CONFIGS))
+def star_config(request):
+    return request.param
 
-        if not use_maker:
-            data_nomaker = data
-        else:
-            assert np.all(
-                data['band_data']['i'][0].image.array ==
-                data_nomaker['band_data']['i'][0].image.array
+
+@pytest.fixture(scope="module")
+def star_sims(wldeblend_catalog_201):
+    """
+    get star sims by star config name and whether make_star_catalog was used.
+    Each sim is made on first use and then cached for the module
+    """
+    cache = {}
+
+    def get_star_sim(config_name, use_maker):
+        key = (config_name, use_maker)
+        if key not in cache:
+            cache[key] = _make_star_sim(
+                galaxy_catalog=wldeblend_catalog_201,
+                config=STAR_CONFIGS[config_name],
+                use_maker=use_maker,
             )
+        return cache[key]
 
+    return get_star_sim
 
-@pytest.mark.skipif(
-    "CATSIM_DIR" not in os.environ,
-    reason='simulation input data is not present',
-)
-def test_sim_star_bleeds():
-    seed = 7421
-    coadd_dim = 201
-    buff = 30
-    rng = np.random.RandomState(seed)
 
-    galaxy_catalog = make_galaxy_catalog(
-        rng=rng,
-        gal_type="wldeblend",
-        coadd_dim=coadd_dim,
-        buff=buff,
-        layout="random",
+@pytest.fixture(scope="module", params=[False, True], ids=['direct', 'maker'])
+def star_sim(request, star_config, star_sims):
+    return star_sims(star_config, request.param)
+
+
+@requires_catsim
+def test_sim_stars(star_sim):
+    star_catalog, _ = star_sim
+    assert len(star_catalog) == star_catalog.shifts_array.size
+
+
+@requires_catsim
+def test_sim_stars_equivalence(star_config, star_sims):
+    _, data_direct = star_sims(star_config, False)
+    _, data_maker = star_sims(star_config, True)
+    assert np.all(
+        data_maker['band_data']['i'][0].image.array ==
+        data_direct['band_data']['i'][0].image.array
     )
 
+
+@requires_catsim
+def test_sim_star_bleeds(rng, wldeblend_catalog_201):
+    coadd_dim = 201
+    buff = 30
+
     star_catalog = StarCatalog(
         rng=rng,
         coadd_dim=coadd_dim,
@@ -452,7 +497,7 @@ def test_sim_star_bleeds():
 
     _ = make_sim(
         rng=rng,
-        galaxy_catalog=galaxy_catalog,
+        galaxy_catalog=wldeblend_catalog_201,
         star_catalog=star_catalog,
         coadd_dim=coadd_dim,
         g1=0.02,
@@ -463,35 +508,27 @@ def test_sim_star_bleeds():
 
 
 @pytest.mark.parametrize("draw_method", (None, "auto", "phot"))
-def test_sim_draw_method_smoke(draw_method):
-    seed = 881
+@pytest.mark.parametrize("rng", [881], indirect=True)
+def test_sim_draw_method_smoke(
+    draw_method, rng, fixed_grid_catalog_201, fixed_gauss_psf,
+):
     coadd_dim = 201
-    rng = np.random.RandomState(seed)
-
-    galaxy_catalog = make_galaxy_catalog(
-        rng=rng,
-        gal_type="fixed",
-        coadd_dim=coadd_dim,
-        buff=30,
-        layout='grid',
-    )
 
     kw = {}
     if draw_method is not None:
         kw['draw_method'] = draw_method
 
-    psf = make_fixed_psf(psf_type="gauss")
     _ = make_sim(
         rng=rng,
-        galaxy_catalog=galaxy_catalog,
+        galaxy_catalog=fixed_grid_catalog_201,
         coadd_dim=coadd_dim,
         g1=0.02,
         g2=0.00,
-        psf=psf,
+        psf=fixed_gauss_psf,
         **kw
     )
 
 
 if __name__ == '__main__':
     for rotate in (False, True):
-        test_sim_exp_mag(rotate, show=True)
+        test_sim_exp_mag(rotate, rng=np.random.RandomState(55), show=True)